@@ -11,19 +11,25 @@
 #     Jesse Keating <jkeating@redhat.com>
 #     Till Maas <opensource@till.name>
 
-from collections import OrderedDict, defaultdict
-from functools import lru_cache
-from queue import Queue
-from threading import Thread
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cached_property
 import argparse
+import contextlib
 import datetime
 import email.mime.text
 import hashlib
+import io
+import itertools
 import json
+import multiprocessing
 import os
+import re
 import smtplib
+import sqlite3
 import sys
 import textwrap
+import threading
 import time
 import traceback
 
@@ -31,6 +37,9 @@ import dnf
 import requests
 import koji
 import dogpile.cache
+import dogpile.cache.api
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     import texttable
@@ -38,15 +47,114 @@ try:
 except ImportError:
     with_table = False
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+
+class SQLiteBackend(dogpile.cache.api.BytesBackend):
+    """ dogpile.cache backend storing values in a SQLite database in WAL
+        mode, so that threads can use the cache without serializing on a
+        file lock like the dbm backend does
+    """
+    def __init__(self, arguments):
+        self.filename = arguments['filename']
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=60,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY,
+                                                  value BLOB, created REAL);
+                CREATE INDEX IF NOT EXISTS cache_created ON cache (created);
+            """)
+            self._local.connection = connection
+        return connection
+
+    def get_serialized(self, key):
+        row = self.connection.execute(
+            'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return dogpile.cache.api.NO_VALUE
+        return row[0]
+
+    def get_serialized_multi(self, keys):
+        return [self.get_serialized(key) for key in keys]
+
+    def set_serialized(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, created) '
+            'VALUES (?, ?, ?)', (key, value, time.time()))
+
+    def set_serialized_multi(self, mapping):
+        now = time.time()
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, created) '
+            'VALUES (?, ?, ?)',
+            [(key, value, now) for key, value in mapping.items()])
+
+    def delete(self, key):
+        self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_multi(self, keys):
+        self.connection.executemany('DELETE FROM cache WHERE key = ?',
+                                    [(key,) for key in keys])
+
+    def expire_old(self, age):
+        """ Delete the values stored more than ``age`` seconds ago, dogpile
+            only ignores expired values but keeps them around
+        """
+        self.connection.execute('DELETE FROM cache WHERE created < ?',
+                                (time.time() - age,))
+
+
+dogpile.cache.register_backend(
+    'find-unblocked-orphans.sqlite', __name__, 'SQLiteBackend')
 
 cache = dogpile.cache.make_region().configure(
-    'dogpile.cache.dbm',
+    'find-unblocked-orphans.sqlite',
     expiration_time=86400,
     arguments=dict(
-        filename=os.path.expanduser('~/.cache/dist-git-orphans-cache.dbm')),
+        filename=os.path.expanduser('~/.cache/dist-git-orphans-cache.sqlite')),
 )
+# seconds to keep values in the cache database, well above the expiration
+# time so that the orphan pages can be revalidated with their ETags
+CACHE_CLEANUP_AGE = 30 * 86400
+# provides/requires indexes of the dnf sack by repo content
+INDEX_CACHE_FILENAME = os.path.expanduser(
+    '~/.cache/find-unblocked-orphans-index.db')
+# seconds to keep indexes for other repo contents
+INDEX_CACHE_EXPIRATION = 7 * 86400
+# bump when the way the sack is indexed changes to ignore cached indexes
+INDEX_FORMAT_VERSION = 2
+# downloaded repo metadata, reused between runs
+DNF_CACHEDIR = os.path.expanduser('~/.cache/find-unblocked-orphans-dnf')
+# seconds to reuse downloaded repo metadata without checking for updates
+DNF_METADATA_EXPIRE = 3600
 PAGURE_URL = 'https://src.fedoraproject.org'
 PAGURE_MAX_ENTRIES_PER_PAGE = 100
+# number of parallel requests for (co)maintainer information
+PAGURE_WORKERS = 32
+
+# shared session to reuse connections to pagure, retries failed requests
+# with exponential backoff
+SESSION = requests.Session()
+SESSION.headers['User-Agent'] = 'find_unblocked_orphans'
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=PAGURE_WORKERS,
+    pool_maxsize=PAGURE_WORKERS,
+    max_retries=Retry(total=20, backoff_factor=0.3,
+                      status_forcelist=[429, 500, 502, 503, 504]),
+))
 
 
 EPEL7_RELEASE = dict(
@@ -171,48 +279,66 @@ def send_mail(from_, to, subject, text, bcc=None):
     return errors
 
 
+@cache.cache_on_arguments(expiration_time=3600)
+def get_pagure_project(namespace, package):
+    response = SESSION.get(f'{PAGURE_URL}/api/0/{namespace}/{package}')
+    pkginfo = json_loads(response.content)
+    if 'error' in pkginfo:
+        # This is likely a "project not found" 404 error.
+        raise ValueError(pkginfo['error'])
+    return pkginfo
+
+
 class PagureInfo:
-    def __init__(self, package, branch=RAWHIDE_RELEASE["pagure_branch"], ns='rpms'):
+    def __init__(self, package, branch=RAWHIDE_RELEASE["pagure_branch"], ns='rpms',
+                 pkginfo=None):
         self.package = package
         self.branch = branch
 
+        if pkginfo is not None:
+            # project info fetched already, e.g. by a bulk query
+            self.pkginfo = pkginfo
+            return
+
         try:
-            response = requests.get(f'{PAGURE_URL}/api/0/{ns}/{package}')
-            self.pkginfo = response.json()
-            if 'error' in self.pkginfo:
-                # This is likely a "project not found" 404 error.
-                raise ValueError(self.pkginfo['error'])
+            self.pkginfo = get_pagure_project(ns, package)
         except Exception:
             eprint(f"Error getting pagure info for {ns}/{package} on {branch}")
             traceback.print_exc(file=sys.stderr)
             self.pkginfo = None
             return
 
-    def get_people(self):
+    @classmethod
+    def from_dict(cls, project, branch=RAWHIDE_RELEASE["pagure_branch"]):
+        """ Create PagureInfo from a project dict as returned by the pagure
+            projects API without requesting it again
+        """
+        return cls(project['name'], branch, ns=project.get('namespace', 'rpms'),
+                   pkginfo=project)
+
+    @cached_property
+    def people(self):
         if self.pkginfo is None:
             return []
-        people = set()
-        for kind in ['access_users', 'access_groups']:
-            for persons in self.pkginfo[kind].values():
-                for person in persons:
-                    people.add(person)
-        return list(sorted(people))
-
-    @property
-    def age(self):
-        then = self.status_change
-        now = datetime.datetime.utcnow()
-        return now - then
-
-    @property
+        return sorted({
+            *itertools.chain.from_iterable(
+                self.pkginfo['access_users'].values()),
+            *itertools.chain.from_iterable(
+                self.pkginfo['access_groups'].values()),
+        })
+
+    def age_at(self, now):
+        # status_change is the time of its first access without pagure info,
+        # that can be after ``now``
+        return max(now - self.status_change, datetime.timedelta(0))
+
+    @cached_property
     def status_change(self):
         if self.pkginfo is None:
             return datetime.datetime.utcnow()
         # See https://pagure.io/pagure/issue/2412
-        if "date_modified" in self.pkginfo:
-            status_change = float(self.pkginfo["date_modified"])
-        else:
-            status_change = float(self.pkginfo["date_created"])
+        status_change = float(self.pkginfo.get("date_modified") or
+                              self.pkginfo["date_created"])
         status_change = datetime.datetime.utcfromtimestamp(status_change)
         return status_change
 
@@ -220,18 +346,30 @@ class PagureInfo:
         return self.pkginfo.__getitem__(*args, **kwargs)
 
 
+def fetch_pagure_info(package, branch):
+    pkginfo = PagureInfo(package, branch)
+    eprint(f"Got info for {package} on {branch}")
+    return pkginfo
+
+
 def setup_dnf(repo=RAWHIDE_RELEASE["repo"],
-              source_repo=RAWHIDE_RELEASE["source_repo"]):
+              source_repo=RAWHIDE_RELEASE["source_repo"], refresh=False):
     """ Setup dnf query with two repos
+
+        :param refresh: check for new metadata even if the cached metadata
+            is not expired yet
     """
     base = dnf.Base()
-    # use digest to make repo id unique for each URL
+    base.conf.cachedir = DNF_CACHEDIR
+    # use digest to make repo id unique for each URL, this also keeps the
+    # cached metadata of each URL apart
     for baseurl, name in (repo, 'repo'), (source_repo, 'repo-source'):
         r = base.repos.add_new_repo(
             name + '-' + hashlib.sha256(baseurl.encode()).hexdigest(),
             base.conf,
             baseurl=[baseurl],
             skip_if_unavailable=False,
+            metadata_expire=0 if refresh else DNF_METADATA_EXPIRE,
         )
         r.enable()
         r.load()
@@ -240,121 +378,360 @@ def setup_dnf(repo=RAWHIDE_RELEASE["repo"],
     return base.sack.query()
 
 
+def open_index_cache():
+    connection = sqlite3.connect(INDEX_CACHE_FILENAME)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS indexes (repo_id TEXT PRIMARY KEY,
+                                            created REAL);
+        CREATE TABLE IF NOT EXISTS requires (repo_id TEXT, base TEXT,
+                                             pkg_nevra TEXT);
+        CREATE TABLE IF NOT EXISTS provides (repo_id TEXT, base TEXT,
+                                             pkg_nevra TEXT);
+        CREATE INDEX IF NOT EXISTS requires_repo_base
+            ON requires (repo_id, base);
+        CREATE INDEX IF NOT EXISTS provides_repo_base
+            ON provides (repo_id, base);
+    """)
+    return connection
+
+
+def load_indexes(repo_id, packages_by_nevra):
+    """ Return (requirers_index, providers_index) for ``repo_id`` from the
+        index cache or None if they are not cached
+    """
+    try:
+        with contextlib.closing(open_index_cache()) as connection:
+            row = connection.execute(
+                'SELECT 1 FROM indexes WHERE repo_id = ?', (repo_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            indexes = []
+            for table in ('requires', 'provides'):
+                index = defaultdict(list)
+                rows = connection.execute(
+                    f'SELECT base, pkg_nevra FROM {table} WHERE repo_id = ?',
+                    (repo_id,))
+                for base, nevra in rows:
+                    index[base].append(packages_by_nevra[nevra])
+                indexes.append(dict(index))
+            return tuple(indexes)
+    except (sqlite3.Error, OSError):
+        eprint("Error loading cached dependency indexes")
+        traceback.print_exc(file=sys.stderr)
+        return None
+
+
+def save_indexes(repo_id, requirers_index, providers_index):
+    """ Store the indexes for ``repo_id`` in the index cache and drop expired
+        ones
+    """
+    now = time.time()
+    try:
+        with contextlib.closing(open_index_cache()) as connection:
+            with connection:
+                expired = connection.execute(
+                    'SELECT repo_id FROM indexes WHERE created < ?',
+                    (now - INDEX_CACHE_EXPIRATION,)).fetchall()
+                for table in ('indexes', 'requires', 'provides'):
+                    connection.executemany(
+                        f'DELETE FROM {table} WHERE repo_id = ?', expired)
+
+                for table, index in (('requires', requirers_index),
+                                     ('provides', providers_index)):
+                    connection.executemany(
+                        f'INSERT INTO {table} VALUES (?, ?, ?)',
+                        ((repo_id, base, str(pkg))
+                         for base, pkgs in index.items() for pkg in pkgs))
+                connection.execute(
+                    'INSERT OR REPLACE INTO indexes VALUES (?, ?)',
+                    (repo_id, now))
+    except (sqlite3.Error, OSError):
+        eprint("Error saving dependency indexes")
+        traceback.print_exc(file=sys.stderr)
+
+
+def iter_provides(packages):
+    """ Yield all provides of ``packages`` as strings, including their files
+    """
+    for pkg in packages:
+        # all the provides from the package as strings
+        for prov in pkg.provides:
+            yield str(prov)
+
+        # all files as provides
+        # pkg.files is a list of paths
+        # sometimes paths start with "//" instead of "/"
+        # normalise the leading slashes to a single "/", this is cheaper than
+        # os.path.normpath() and rpm file paths contain nothing else it
+        # would collapse
+        for fn in pkg.files:
+            yield '/' + fn.lstrip('/')
+
+
+def group_by_base_provide(provides):
+    """ Group provide strings by their base provide, ignoring versions
+
+        "foo = 1.fc20" -> "foo"
+
+        :returns: dict {base_provide: {prov, ...}}
+    """
+    # deduplicate provides shared between subpackages or listed twice
+    provides_by_base = {}
+    for prov in provides:
+        base_provide = prov.partition(' ')[0]
+        provides_by_base.setdefault(base_provide, set()).add(prov)
+    return provides_by_base
+
+
+RICH_DEP_KEYWORDS = {'and', 'or', 'if', 'else', 'with', 'without', 'unless'}
+RICH_DEP_OPERATORS = {'=', '==', '<', '<=', '>', '>=', '!='}
+
+
+def dependency_names(reldep):
+    """ Return the names referenced by a dependency, ignoring versions
+
+        "foo >= 1.0" -> ["foo"]
+        "(foo >= 1.0 if bar)" -> ["foo", "bar"]
+        "(python3dist(foo) >= 1 with python3dist(foo) < 2)"
+            -> ["python3dist(foo)", "python3dist(foo)"]
+    """
+    reldep = str(reldep)
+    if not reldep.startswith('('):
+        return [reldep.partition(' ')[0]]
+
+    names = []
+    tokens = iter(rich_dep_tokens(reldep))
+    for token in tokens:
+        if token in RICH_DEP_OPERATORS:
+            # skip the version
+            next(tokens, None)
+        elif token not in RICH_DEP_KEYWORDS:
+            names.append(token)
+    return names
+
+
+def rich_dep_tokens(reldep):
+    """ Split a rich dependency into names, keywords and versions
+
+        Parentheses only group when they do not follow a name, so
+        "pkgconfig(gtk+-3.0)" stays one token.
+    """
+    tokens = []
+    token = ''
+    depth = 0
+    for char in reldep:
+        if depth:
+            # inside the parentheses of a name like perl(Foo::Bar)
+            token += char
+            depth += (char == '(') - (char == ')')
+        elif char == '(' and token:
+            token += char
+            depth = 1
+        elif char in '()' or char.isspace():
+            if token:
+                tokens.append(token)
+                token = ''
+        else:
+            token += char
+    if token:
+        tokens.append(token)
+    return tokens
+
+
 @cache.cache_on_arguments()
 def orphan_packages(namespace='rpms'):
     pkgs, pages = get_pagure_orphans(namespace)
-    eprint(f"({pages} pages)", end=" ")
-    for page in range(2, pages + 1):
-        if page % 10:
-            eprint(".", end="")
-        else:
-            eprint(page, end="")
-        new_pkgs, _ = get_pagure_orphans(namespace, page)
-        pkgs.update(new_pkgs)
+    # the first page tells the number of pages, fetch the others in parallel
+    with ThreadPoolExecutor(max_workers=PAGURE_WORKERS) as executor:
+        results = executor.map(get_pagure_orphans,
+                                itertools.repeat(namespace),
+                                range(2, pages + 1))
+        for new_pkgs, _ in results:
+            pkgs.update(new_pkgs)
+    eprint(f"Got {pages} pages of orphans from pagure")
     return pkgs
 
 
-@cache.cache_on_arguments()
 def get_pagure_orphans(namespace, page=1):
     url = PAGURE_URL + '/api/0/projects'
     params = dict(owner=ORPHAN_UID, namespace=namespace,
                   page=page,
                   per_page=PAGURE_MAX_ENTRIES_PER_PAGE)
-    tries = 0
-    response = requests.get(url, params=params)
-    while not bool(response):
-        msg = f"{response.request.url!r} gave {response!r}"
-        if tries > 20:
-            raise IOError(msg)
-        print(msg, file=sys.stderr)
-        time.sleep(tries)
-        tries += 1
-        response = requests.get(url, params=params)
-    pkgs = response.json()['projects']
-    pages = response.json()['pagination']['pages']
+    # Keep the last response with its ETag regardless of the expiration
+    # time and only download the page again if it changed
+    key = f'pagure-orphans:{namespace}:{page}'
+    cached = cache.get(key, ignore_expiration=True)
+    headers = {}
+    if cached is not dogpile.cache.api.NO_VALUE:
+        headers['If-None-Match'] = cached[0]
+    response = SESSION.get(url, params=params, headers=headers)
+    if response.status_code == 304:
+        data = cached[1]
+        # store it again to keep it from being expired
+        cache.set(key, cached)
+    else:
+        response.raise_for_status()
+        data = json_loads(response.content)
+        etag = response.headers.get('ETag')
+        if etag:
+            cache.set(key, (etag, data))
+    pkgs = data['projects']
+    pages = data['pagination']['pages']
     return {p['name']: p for p in pkgs}, pages
 
 
 def unblocked_packages(packages, tagID=RAWHIDE_RELEASE["koji_tag"], kojihub=RAWHIDE_RELEASE["koji_hub"]):
-    unblocked = []
     kojisession = koji.ClientSession(kojihub)
 
-    kojisession.multicall = True
-    for p in packages:
-        kojisession.listPackages(tagID=tagID, pkgID=p, inherited=True)
-    listings = kojisession.multiCall()
-
-    # Check the listings for unblocked packages.
-
-    for pkgname, result in zip(packages, listings):
-        if isinstance(result, list):
-            [pkg] = result
-            if pkg:
-                if not pkg[0]['blocked']:
-                    package_name = pkg[0]['package_name']
-                    unblocked.append(package_name)
-            else:
-                # TODO - what state does this condition represent?
-                pass
-        else:
-            print(f"ERROR: {pkgname}: {result}")
-    return unblocked
+    # A single listing of the whole tag is much cheaper than a listPackages
+    # call per package, packages not in the tag count as blocked
+    listing = kojisession.listPackages(tagID=tagID, inherited=True)
+    blocked = {pkg['package_name']: pkg['blocked'] for pkg in listing}
+    for pkgname in packages:
+        if pkgname not in blocked:
+            eprint(f"ERROR: {pkgname}: not found in koji tag {tagID}")
+    return [p for p in packages if not blocked.get(p, True)]
 
 
 class DepChecker:
-    def __init__(self, release, repo=None, source_repo=None, namespace='rpms'):
+    def __init__(self, release, repo=None, source_repo=None, namespace='rpms',
+                 refresh=False):
         self._src_by_bin = None
         self._bin_by_src = None
+        self._srpm_name_by_bin = None
+        self._srpm_index = None
+        self._providers_index = None
+        self._requirers_index = None
         self.release = release
         repo = repo or RELEASES[release]["repo"]
         source_repo = source_repo or RELEASES[release]["source_repo"]
 
-        dnfquery = setup_dnf(repo=repo, source_repo=source_repo)
+        dnfquery = setup_dnf(repo=repo, source_repo=source_repo,
+                             refresh=refresh)
         self.dnfquery = dnfquery
-        self.pagureinfo_queue = Queue()
+        # all packages of the sack, to not run the query for every pass
+        self._all_pkgs = list(dnfquery)
+        self.branch = RELEASES[release]["pagure_branch"]
+        self.pagure_executor = ThreadPoolExecutor(max_workers=PAGURE_WORKERS)
+        self.pagure_futures = {}
         self.pagure_dict = {}
         self.not_in_repo = []
+        # find_dependent_packages() results and grouped provides by SRPM name
+        self._dependent_packages_cache = {}
+        self._provides_cache = {}
 
     def create_mapping(self):
         src_by_bin = {}  # Dict of source pkg objects by binary package objects
-        bin_by_src = {}  # Dict of binary pkgobjects by srpm name
+        bin_by_src = defaultdict(list)  # Dict of binary pkgobjects by srpm name
+        srpm_name_by_bin = {}
+        # source pkg objects by sourcerpm header, most SRPMs build several
+        # binary packages
+        srpm_by_sourcerpm = {}
+
+        # Index all source packages once instead of querying the sack for
+        # every binary package
+        self._srpm_index = {(p.name, p.version, p.release): p
+                            for p in self._all_pkgs if p.arch == 'src'}
 
         # Populate the dicts
-        for rpm_package in self.dnfquery:
+        for rpm_package in self._all_pkgs:
             if rpm_package.arch == 'src':
                 continue
-            srpm = self.SRPM(rpm_package)
+            sourcerpm = rpm_package.sourcerpm
+            srpm = srpm_by_sourcerpm.get(sourcerpm)
+            if srpm is None:
+                srpm = srpm_by_sourcerpm[sourcerpm] = self.SRPM(rpm_package)
             src_by_bin[rpm_package] = srpm
-            if srpm.name in bin_by_src:
-                bin_by_src[srpm.name].append(rpm_package)
-            else:
-                bin_by_src[srpm.name] = [rpm_package]
+            bin_by_src[srpm.name].append(rpm_package)
+            srpm_name_by_bin[rpm_package] = srpm.name
 
         self._src_by_bin = src_by_bin
-        self._bin_by_src = bin_by_src
+        self._bin_by_src = dict(bin_by_src)
+        self._srpm_name_by_bin = srpm_name_by_bin
 
     @property
     def by_src(self):
-        if not self._bin_by_src:
+        if self._bin_by_src is None:
             self.create_mapping()
         return self._bin_by_src
 
     @property
     def by_bin(self):
-        if not self._src_by_bin:
+        if self._src_by_bin is None:
             self.create_mapping()
         return self._src_by_bin
 
+    def build_indexes(self):
+        """ Index the packages in the sack by the names they require and
+            by the names they provide, instead of querying dnf for every
+            provide. The indexes are cached on disk by the repo contents.
+        """
+        packages_by_nevra = {str(pkg): pkg for pkg in self._all_pkgs}
+        repo_id = hashlib.sha256('\n'.join(
+            [f'index format {INDEX_FORMAT_VERSION}',
+             *sorted(packages_by_nevra)]).encode()).hexdigest()
+
+        indexes = load_indexes(repo_id, packages_by_nevra)
+        if indexes is None:
+            indexes = self.index_sack()
+            save_indexes(repo_id, *indexes)
+        self._requirers_index, self._providers_index = indexes
+
+    def index_sack(self):
+        """ Return (requirers_index, providers_index) for all packages in the
+            sack
+        """
+        # Dict of package objects by required base provide
+        requirers_index = defaultdict(list)
+        for pkg in self._all_pkgs:
+            required = set()
+            for req in pkg.requires:
+                required.update(dependency_names(req))
+            for name in required:
+                requirers_index[name].append(pkg)
+
+        # Dict of package objects by provided base provide, only provides
+        # that are required by something are interesting
+        providers_index = defaultdict(list)
+        for pkg in self._all_pkgs:
+            provided = {prov.partition(' ')[0] for prov in iter_provides([pkg])}
+            for name in provided.intersection(requirers_index):
+                providers_index[name].append(pkg)
+
+        return dict(requirers_index), dict(providers_index)
+
+    @property
+    def providers_index(self):
+        if self._providers_index is None:
+            self.build_indexes()
+        return self._providers_index
+
+    @property
+    def requirers_index(self):
+        if self._requirers_index is None:
+            self.build_indexes()
+        return self._requirers_index
+
+    @property
+    def srpm_name_by_bin(self):
+        if self._srpm_name_by_bin is None:
+            self.create_mapping()
+        return self._srpm_name_by_bin
+
     def find_dependent_packages(self, srpmname, ignore):
         """ Return packages depending on packages built from SRPM ``srpmname``
             that are built from different SRPMS not specified in ``ignore``.
 
-            :param ignore: list of binary package names that will not be
+            :param ignore: set of binary package names that will not be
                 returned as dependent packages or considered as alternate
                 providers
-            :type ignore: list() of str()
+            :type ignore: set() of str()
 
-            :returns: OrderedDict dependent_package: list of requires only
+            :returns: dict dependent_package: list of requires only
                 provided by package ``srpmname`` {dep_pkg: [prov, ...]}
         """
         # Some of this code was stolen from repoquery
@@ -367,252 +744,396 @@ class DepChecker:
             # If we don't have a package in the repo, there is nothing to do
             eprint(f"Package {srpmname} not found in repo")
             self.not_in_repo.append(srpmname)
-            rpms = []
-
-        # provides of all packages built from ``srpmname``
-        provides = []
-        for pkg in rpms:
-            # add all the provides from the package as strings
-            string_provides = [str(prov) for prov in pkg.provides]
-            provides.extend(string_provides)
-
-            # add all files as provides
-            # pkg.files is a list of paths
-            # sometimes paths start with "//" instead of "/"
-            # normalise "//" to "/":
-            # os.path.normpath("//") == "//", but
-            # os.path.normpath("///") == "/"
-            file_provides = [os.path.normpath(f'//{fn}') for fn in pkg.files]
-            provides.extend(file_provides)
+            return {}
+        rpms_set = frozenset(rpms)
+
+        # The result only depends on which of the alternate providers are
+        # ignored, reuse it if that did not change since the last call
+        cached = self._dependent_packages_cache.get(srpmname)
+        if cached is not None:
+            provider_names, ignored, cached_packages = cached
+            if provider_names.intersection(ignore) == ignored:
+                return cached_packages
+
+        # bind lookups used in the loops below to locals
+        providers_index = self.providers_index
+        requirers_index = self.requirers_index
+
+        # provides of all packages built from ``srpmname`` that are required
+        # by any package, leaf packages end up without any
+        provides_by_base = self._provides_cache.get(srpmname)
+        if provides_by_base is None:
+            provides_by_base = {
+                base_provide: provs for base_provide, provs
+                in group_by_base_provide(iter_provides(rpms)).items()
+                if base_provide in requirers_index}
+            self._provides_cache[srpmname] = provides_by_base
+        if not provides_by_base:
+            return {}
+
+        provider_names = {pkg.name for base_provide in provides_by_base
+                          for pkg in providers_index.get(base_provide, ())
+                          if pkg not in rpms_set}
 
         # Zip through the provides and find what's needed
-        for prov in provides:
-            # check only base provide, ignore specific versions
-            # "foo = 1.fc20" -> "foo"
-            base_provide, *_ = prov.split()
-
-            # FIXME: Workaround for:
-            # https://bugzilla.redhat.com/show_bug.cgi?id=1191178
-            if base_provide[0] == "/":
-                base_provide = base_provide.replace("[", "?")
-                base_provide = base_provide.replace("]", "?")
-
+        for base_provide, provs in provides_by_base.items():
             # Elide provide if also provided by another package
-            for pkg in self.dnfquery.filter(provides=base_provide):
+            for pkg in providers_index.get(base_provide, ()):
                 # FIXME: might miss broken dependencies in case the other
                 # provider depends on a to-be-removed package as well
                 if pkg.name in ignore:
                     # eprint(f"Ignoring provider package {pkg.name}")
                     pass
-                elif pkg not in rpms:
+                elif pkg not in rpms_set:
                     break
             else:
-                for dependent_pkg in self.dnfquery.filter(
-                        requires=base_provide):
+                for dependent_pkg in requirers_index.get(base_provide, ()):
                     # skip if the dependent rpm package belongs to the
                     # to-be-removed Fedora package
-                    if dependent_pkg in self.by_src[srpmname]:
+                    if dependent_pkg in rpms_set:
                         continue
 
                     # use setdefault to either create an entry for the
                     # dependent package or add the required prov
-                    dependent_packages.setdefault(dependent_pkg, set()).add(
-                        prov)
-        return OrderedDict(sorted(dependent_packages.items()))
+                    dependent_packages.setdefault(dependent_pkg, set()).update(
+                        provs)
+        dependent_packages = dict(sorted(dependent_packages.items()))
+        self._dependent_packages_cache[srpmname] = (
+            provider_names, provider_names.intersection(ignore),
+            dependent_packages)
+        return dependent_packages
+
+    def add_pagure_projects(self, projects):
+        """ Use the pagure project dicts in ``projects`` by package name as
+            (co)maintainer information instead of requesting it per package
+        """
+        for package, project in projects.items():
+            self.pagure_dict[package] = PagureInfo.from_dict(project,
+                                                             self.branch)
 
-    def pagure_worker(self):
-        branch = RELEASES[self.release]["pagure_branch"]
+    def queue_pagure_info(self, package):
+        """ Start fetching (co)maintainer information for ``package`` unless
+            it is known already or was already requested
+        """
+        if (package not in self.pagure_dict and
+                package not in self.pagure_futures):
+            self.pagure_futures[package] = self.pagure_executor.submit(
+                fetch_pagure_info, package, self.branch)
+
+    def walk_deps(self, name, ignore, max_deps=20):
+        """ Recursively find the packages depending on SRPM ``name``
+
+            :param ignore: set of binary package names that will not be
+                considered as alternate providers, it is extended with the
+                dependent SRPMs that are found
+            :param max_deps: stop the walk after this many dependent SRPMs
+
+            :returns: tuple (deps, complete, dep_chain) with deps mapping
+                dependent SRPM names to {dep_pkg: {prov, ...}}, complete being
+                False if the walk was stopped because of ``max_deps`` and
+                dep_chain mapping dependent SRPM names to the SRPMs they
+                depend on
+        """
+        eprint(f"Getting packages depending on: {name}")
+        srpm_name_by_bin = self.srpm_name_by_bin
+        dep_chain = defaultdict(set)
+        # {srpm_name: {dependent_pkg: {prov, ...}}}
+        deps = defaultdict(lambda: defaultdict(set))
+        to_check = deque([name])
+        # sets mirroring to_check and new_names for fast membership tests
+        to_check_set = {name}
+        allow_more = True
+        seen = set()
         while True:
-            package = self.pagureinfo_queue.get()
-            if package not in self.pagure_dict:
-                pkginfo = PagureInfo(package, branch)
-                qsize = self.pagureinfo_queue.qsize()
-                eprint(f"Got info for {package} on {branch}, todo: {qsize}")
-                self.pagure_dict[package] = pkginfo
-            self.pagureinfo_queue.task_done()
-
-    def recursive_deps(self, packages, max_deps=20):
+            eprint(f"to_check ({len(to_check)}): {list(to_check)}")
+            check_next = to_check.popleft()
+            to_check_set.discard(check_next)
+            seen.add(check_next)
+            dependent_packages = self.find_dependent_packages(check_next,
+                                                              ignore)
+            if dependent_packages:
+                new_names = []
+                new_names_set = set()
+                new_srpm_names = set()
+                for pkg, dependencies in dependent_packages.items():
+                    # source packages are not in the mapping
+                    srpm_name = srpm_name_by_bin.get(pkg) or pkg.name
+                    if (srpm_name not in to_check_set and
+                            srpm_name not in new_names_set and
+                            srpm_name not in seen):
+                        new_names.append(srpm_name)
+                        new_names_set.add(srpm_name)
+                    new_srpm_names.add(srpm_name)
+
+                    deps[srpm_name][pkg].update(dependencies)
+                for new_srpm_name in new_srpm_names:
+                    dep_chain[new_srpm_name].add(check_next)
+
+                ignore.update(new_names)
+                if allow_more:
+                    to_check.extend(new_names)
+                    to_check_set.update(new_names)
+                    found_deps = deps.keys()
+                    dep_count = len(found_deps | to_check_set)
+                    if dep_count > max_deps:
+                        todo_deps = max_deps - len(found_deps)
+                        if todo_deps < 0:
+                            todo_deps = 0
+                        eprint(f"Dep count is {dep_count}")
+
+                        allow_more = False
+                        to_check = deque(
+                            itertools.islice(to_check, todo_deps))
+                        to_check_set = set(to_check)
+            if not to_check:
+                break
+        deps = {srpm_name: dict(pkgs) for srpm_name, pkgs in deps.items()}
+        return deps, allow_more, dep_chain
+
+    def walk_deps_parallel(self, names, ignore, max_deps, jobs):
+        """ Run walk_deps for all ``names`` in ``jobs`` forked processes
+
+            Every walk starts with its own copy of ``ignore``, so unlike
+            sequential walks they do not see the SRPMs found by the walks for
+            other packages.
+
+            Must be called before any (co)maintainer information is queued, a
+            child forked while a pagure thread holds a lock, e.g. the one of
+            sys.stderr, would hang.
+
+            :returns: list of (deps, complete, dep_chain) in order of ``names``
+        """
+        global _walk_args
+        # build the indexes once before forking, so the workers share them
+        # instead of building their own copies
+        if self._providers_index is None:
+            self.build_indexes()
+        _walk_args = (self, ignore, max_deps)
+        # dnf packages cannot be pickled, the workers return them by NEVRA
+        packages_by_nevra = {str(pkg): pkg for pkg in self._all_pkgs}
+        walks = []
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 mp_context=context) as executor:
+            for deps, complete, dep_chain, not_in_repo in executor.map(
+                    _walk_deps_worker, names):
+                self.not_in_repo.extend(not_in_repo)
+                deps = {srpm_name: {packages_by_nevra[nevra]: provs
+                                    for nevra, provs in pkgs.items()}
+                        for srpm_name, pkgs in deps.items()}
+                walks.append((deps, complete, dep_chain))
+        return walks
+
+    def recursive_deps(self, packages, max_deps=20, jobs=1, free_sack=False):
         incomplete = []
-        # Start threads to get information about (co)maintainers for packages
-        for _ in range(0, 2):
-            people_thread = Thread(target=self.pagure_worker)
-            people_thread.daemon = True
-            people_thread.start()
+        names = sorted(packages)
+        # the walk processes need to be forked before the pagure threads
+        # start, the lookups are queued after the walks then
+        parallel = jobs > 1 and len(names) > 1
         # get a list of all rpm_pkgs that are to be removed
-        rpm_pkg_names = []
+        rpm_pkg_names = set()
         for name in packages:
-            self.pagureinfo_queue.put(name)
+            if not parallel:
+                # get information about (co)maintainers in the background
+                self.queue_pagure_info(name)
             # Empty list if pkg is only for a different arch
             bin_pkgs = self.by_src.get(name, [])
-            rpm_pkg_names.extend([p.name for p in bin_pkgs])
+            rpm_pkg_names.update(p.name for p in bin_pkgs)
 
+        self._dependent_packages_cache = {}
         # dict for all dependent packages for each to-be-removed package
-        dep_map = OrderedDict()
+        dep_map = {}
         self.dep_chain = defaultdict(set)
-        for name in sorted(packages):
+        if parallel:
+            walks = self.walk_deps_parallel(names, rpm_pkg_names, max_deps,
+                                            jobs)
+        else:
+            # the walks share ``ignore``
+            walks = (self.walk_deps(name, rpm_pkg_names, max_deps)
+                     for name in names)
+
+        for name, (deps, complete, dep_chain) in zip(names, walks):
+            self.queue_pagure_info(name)
             self.dep_chain[name] = set()  # explicitly initialize the set for the orphaned
-            eprint(f"Getting packages depending on: {name}")
-            ignore = rpm_pkg_names
-            dep_map[name] = OrderedDict()
-            to_check = [name]
-            allow_more = True
-            seen = []
-            while True:
-                eprint(f"to_check ({len(to_check)}): {to_check}")
-                check_next = to_check.pop(0)
-                seen.append(check_next)
-                dependent_packages = self.find_dependent_packages(check_next,
-                                                                  ignore)
-                if dependent_packages:
-                    new_names = []
-                    new_srpm_names = set()
-                    for pkg, dependencies in dependent_packages.items():
-                        if pkg.arch != "src":
-                            srpm_name = self.by_bin[pkg].name
-                        else:
-                            srpm_name = pkg.name
-                        if (srpm_name not in to_check and
-                                srpm_name not in new_names and
-                                srpm_name not in seen):
-                            new_names.append(srpm_name)
-                        new_srpm_names.add(srpm_name)
-
-                        for dep in dependencies:
-                            dep_map[name].setdefault(
-                                srpm_name,
-                                OrderedDict()
-                            ).setdefault(pkg, set()).add(dep)
-                    for new_srpm_name in new_srpm_names:
-                        self.dep_chain[new_srpm_name].add(check_next)
-
-                    for srpm_name in new_srpm_names:
-                        self.pagureinfo_queue.put(srpm_name)
-
-                    ignore.extend(new_names)
-                    if allow_more:
-                        to_check.extend(new_names)
-                        found_deps = dep_map[name].keys()
-                        dep_count = len(set(found_deps) | set(to_check))
-                        if dep_count > max_deps:
-                            todo_deps = max_deps - len(found_deps)
-                            if todo_deps < 0:
-                                todo_deps = 0
-                            incomplete.append(name)
-                            eprint(f"Dep count is {dep_count}")
-                            eprint(f"incomplete is {incomplete}")
-
-                            allow_more = False
-                            to_check = to_check[0:todo_deps]
-                if not to_check:
-                    break
-            if not allow_more:
+            dep_map[name] = deps
+            for srpm_name, dependers in dep_chain.items():
+                self.dep_chain[srpm_name].update(dependers)
+                self.queue_pagure_info(srpm_name)
+            if not complete:
+                incomplete.append(name)
+                eprint(f"incomplete is {incomplete}")
                 eprint(f"More than {max_deps} broken deps for package "
                        f"'{name}', dependency check not completed")
 
+        if free_sack:
+            # every package object references the whole sack, keep only the
+            # NEVRAs of the dependent packages so that it can be freed
+            dep_map = {name: {srpm_name: {str(pkg): provs
+                                          for pkg, provs in pkgs.items()}
+                              for srpm_name, pkgs in deps.items()}
+                       for name, deps in dep_map.items()}
+            self.release_sack()
+
         eprint("Waiting for (co)maintainer information...", end=' ')
-        self.pagureinfo_queue.join()
+        for package, future in self.pagure_futures.items():
+            self.pagure_dict[package] = future.result()
         eprint("done")
         return dep_map, incomplete
 
+    def release_sack(self):
+        """ Drop the references to the dnf sack and the mappings built from
+            it to free memory, no dependencies can be checked afterwards
+
+            The sack is only freed once no package objects are referenced
+            elsewhere anymore, each of them keeps the whole sack alive.
+        """
+        self.dnfquery = None
+        self._all_pkgs = None
+        self._src_by_bin = None
+        self._bin_by_src = None
+        self._srpm_name_by_bin = None
+        self._srpm_index = None
+        self._providers_index = None
+        self._requirers_index = None
+        self._dependent_packages_cache = {}
+        self._provides_cache = {}
+
     # This function was stolen from pungi
     def SRPM(self, package):
         """Given a package object, get a package object for the
-        corresponding source rpm. Requires dnf still configured
-        and a valid package object."""
-        srpm, *_ = package.sourcerpm.split('.src.rpm')
-        sname, sver, srel = srpm.rsplit('-', 2)
-        return srpm_nvr_object(self.dnfquery, sname, sver, srel)
+        corresponding source rpm. Requires the source rpm index built
+        by create_mapping and a valid package object."""
+        try:
+            return self._srpm_index[parse_sourcerpm(package.sourcerpm)]
+        except KeyError:
+            eprint(f"Error: Cannot find a source rpm for {package.sourcerpm}")
+            sys.exit(1)
 
 
-@lru_cache(maxsize=2048)
-def srpm_nvr_object(query, name, version, release):
-    try:
-        return query.filter(name=name, version=version, release=release, arch='src').run()[0]
+# (depchecker, ignore, max_deps) for the forked walk_deps workers
+_walk_args = None
 
-    except IndexError:
-        eprint(
-            f"Error: Cannot find a source rpm for {name}-{version}-{release}")
-        sys.exit(1)
 
+def _walk_deps_worker(name):
+    depchecker, ignore, max_deps = _walk_args
+    not_in_repo = len(depchecker.not_in_repo)
+    deps, complete, dep_chain = depchecker.walk_deps(name, set(ignore),
+                                                     max_deps)
+    deps = {srpm_name: {str(pkg): provs for pkg, provs in pkgs.items()}
+            for srpm_name, pkgs in deps.items()}
+    return deps, complete, dep_chain, depchecker.not_in_repo[not_in_repo:]
 
-def maintainer_table(packages, pagure_dict):
-    affected_people = {}
 
-    if with_table:
-        table = texttable.Texttable(max_width=80)
-        table.header(["Package", "(co)maintainers", "Status Change"])
-        table.set_cols_align(["l", "l", "l"])
-        table.set_deco(table.HEADER)
-    else:
-        table = ""
+SOURCERPM_RE = re.compile(r'(.+)-([^-]+)-([^-]+)\.src\.rpm')
 
-    for package_name in packages:
-        pkginfo = pagure_dict[package_name]
-        people = pkginfo.get_people()
-        for p in people:
-            affected_people.setdefault(p, set()).add(package_name)
-        p = ', '.join(people)
-        age = pkginfo.age
-        agestr = f"{age.days // 7} weeks ago"
 
-        if with_table:
-            table.add_row([package_name, p, agestr])
-        else:
-            table += f"{package_name} {p} {agestr}\n"
+def parse_sourcerpm(sourcerpm):
+    """ Return (name, version, release) of a source rpm file name like
+        "foo-1.0-1.fc40.src.rpm" or None if it is not one
+    """
+    match = SOURCERPM_RE.fullmatch(sourcerpm)
+    if match is None:
+        return None
+    return match.groups()
 
-    if with_table:
-        table = table.draw()
-    return table, affected_people
 
+def maintainer_table(out, packages, people_by_pkg, age_weeks):
+    affected_people = {}
 
-def dependency_info(dep_map, affected_people, pagure_dict, incomplete):
-    info = ""
+    rows = []
+    for package_name in packages:
+        people = people_by_pkg[package_name]
+        for p in people:
+            affected_people.setdefault(p, set()).add(package_name)
+        p = ', '.join(people)
+        agestr = f"{age_weeks[package_name]} weeks ago"
+        rows.append([package_name, p, agestr])
+
+    if not with_table:
+        for row in rows:
+            out.write(" ".join(row) + "\n")
+        return affected_people
+
+    header = ["Package", "(co)maintainers", "Status Change"]
+    widths = [max(map(len, column)) for column in zip(header, *rows)]
+    if sum(widths) + 3 * (len(widths) - 1) > 80:
+        # Let texttable wrap the cells to shrink the columns
+        table = texttable.Texttable(max_width=80)
+        table.header(header)
+        table.set_cols_align(["l", "l", "l"])
+        table.set_deco(table.HEADER)
+        table.add_rows(rows, header=False)
+        out.write(table.draw())
+        return affected_people
+
+    # Nothing to wrap, format the table like texttable does without the
+    # overhead of measuring and wrapping every cell
+    lines = []
+    centered = []
+    for cell, width in zip(header, widths):
+        fill = width - len(cell)
+        centered.append(" " * (fill // 2) + cell + " " * (fill - fill // 2))
+    lines.append("   ".join(centered))
+    lines.append("===".join("=" * width for width in widths))
+    for row in rows:
+        lines.append("   ".join(cell.ljust(width)
+                                for cell, width in zip(row, widths)))
+    out.write("\n".join(lines))
+    return affected_people
+
+
+def dependency_info(out, dep_map, affected_people, pagure_dict, people_by_pkg,
+                    age_weeks, incomplete):
     for package_name, subdict in dep_map.items():
         if subdict:
-            pkginfo = pagure_dict[package_name]
-            status_change = pkginfo.status_change.strftime("%Y-%m-%d")
-            age = pkginfo.age.days // 7
-            fmt = "Depending on: {} ({}), status change: {} ({} weeks ago)\n"
-            info += fmt.format(package_name, len(subdict.keys()),
-                               status_change, age)
+            status_change = pagure_dict[package_name].status_change
+            status_change = status_change.strftime("%Y-%m-%d")
+            age = age_weeks[package_name]
+            out.write(f"Depending on: {package_name} ({len(subdict)}), "
+                      f"status change: {status_change} ({age} weeks ago)\n")
             for fedora_package, dependent_packages in subdict.items():
-                people = pagure_dict[fedora_package].get_people()
+                people = people_by_pkg[fedora_package]
                 for p in people:
                     affected_people.setdefault(p, set()).add(package_name)
                 p = ", ".join(people)
-                info += f"\t{fedora_package} (maintained by: {p})\n"
+                out.write(f"\t{fedora_package} (maintained by: {p})\n")
                 for dep in dependent_packages:
                     provides = ", ".join(sorted(dependent_packages[dep]))
-                    info += f"\t\t{dep} requires {provides}\n"
-                info += "\n"
+                    out.write(f"\t\t{dep} requires {provides}\n")
+                out.write("\n")
         if package_name in incomplete:
-            info += f"\tToo many dependencies for {package_name}, "
-            info += "not all listed here\n\n"
-    return info
+            out.write(f"\tToo many dependencies for {package_name}, "
+                      "not all listed here\n\n")
 
 
-def maintainer_info(affected_people):
-    info = ""
+def maintainer_info(out, affected_people):
     for person in sorted(affected_people):
         packages = affected_people[person]
         if person == ORPHAN_UID:
             continue
-        info += f"{person}: {', '.join(packages)}\n"
-    return info
+        out.write(f"{person}: {', '.join(packages)}\n")
 
 
-def package_info(unblocked, dep_map, depchecker, orphans=None, failed=None,
-                 week_limit=6, release="", incomplete=[]):
-    info = ""
+def package_info(out, unblocked, dep_map, depchecker, orphans=None,
+                 failed=None, week_limit=6, release="", incomplete=[]):
+    """ Write the report about ``unblocked`` to the file object ``out`` and
+        return the addresses of the affected (co)maintainers
+    """
     pagure_dict = depchecker.pagure_dict
+    people_by_pkg = {pkg: pkginfo.people for pkg, pkginfo in pagure_dict.items()}
+    # use the same point in time for all ages in the report
+    now = datetime.datetime.utcnow()
+    age_weeks = {pkg: pkginfo.age_at(now).days // 7
+                 for pkg, pkginfo in pagure_dict.items()}
 
-    table, affected_people = maintainer_table(unblocked, pagure_dict)
-    info += table
-    info += "\n\nThe following packages require above mentioned packages:\n"
-    info += dependency_info(dep_map, affected_people, pagure_dict, incomplete)
+    affected_people = maintainer_table(out, unblocked, people_by_pkg,
+                                       age_weeks)
+    out.write("\n\nThe following packages require above mentioned packages:\n")
+    dependency_info(out, dep_map, affected_people, pagure_dict, people_by_pkg,
+                    age_weeks, incomplete)
 
-    info += "Affected (co)maintainers\n"
-    info += maintainer_info(affected_people)
+    out.write("Affected (co)maintainers\n")
+    maintainer_info(out, affected_people)
 
     if release:
         release_text = f" ({release})"
@@ -633,48 +1154,46 @@ def package_info(unblocked, dep_map, depchecker, orphans=None, failed=None,
 
     if orphans:
         orphans = [o for o in orphans if o in unblocked]
-        info += wrap_and_format("Orphans", orphans)
+        out.write(wrap_and_format("Orphans", orphans))
 
         orphans_breaking_deps = [o for o in orphans if dep_map.get(o)]
-        info += wrap_and_format("Orphans (dependend on)",
-                                orphans_breaking_deps)
+        out.write(wrap_and_format("Orphans (dependend on)",
+                                  orphans_breaking_deps))
 
         orphans_breaking_deps_stale = [
             o for o in orphans_breaking_deps if
-            (pagure_dict[o].age.days // 7) >= week_limit]
+            age_weeks[o] >= week_limit]
 
-        info += wrap_and_format(
+        out.write(wrap_and_format(
             f"Orphans{release_text} for at least {week_limit} "
             "weeks (dependend on)",
-            orphans_breaking_deps_stale)
+            orphans_breaking_deps_stale))
 
         orphans_not_breaking_deps = [o for o in orphans if not dep_map.get(o)]
 
-        info += wrap_and_format(f"Orphans{release_text} (not depended on)",
-                                orphans_not_breaking_deps)
+        out.write(wrap_and_format(f"Orphans{release_text} (not depended on)",
+                                  orphans_not_breaking_deps))
 
         orphans_not_breaking_deps_stale = [
             o for o in orphans_not_breaking_deps if
-            (pagure_dict[o].age.days // 7) >= week_limit]
+            age_weeks[o] >= week_limit]
 
         if orphans_not_breaking_deps_stale:
             eprint(f"fedretire --orphan --branch {branch} -- " +
                    " ".join(orphans_not_breaking_deps_stale))
 
-        info += wrap_and_format(
+        out.write(wrap_and_format(
             f"Orphans{release_text} for at least {week_limit} "
             "weeks (not dependend on)",
-            orphans_not_breaking_deps_stale)
+            orphans_not_breaking_deps_stale))
 
-    breaking = set()
-    for package, deps in dep_map.items():
-        breaking = breaking.union(set(deps))
+    breaking = set(itertools.chain.from_iterable(dep_map.values()))
 
     if breaking:
-        info += wrap_and_format(f"Depending packages{release_text}", sorted(breaking))
+        out.write(wrap_and_format(f"Depending packages{release_text}", sorted(breaking)))
 
         if orphans:
-            reverse_deps = OrderedDict()
+            reverse_deps = {}
             stale_breaking = set()
             for package in orphans_breaking_deps_stale:
                 for depender in dep_map[package]:
@@ -687,33 +1206,58 @@ def package_info(unblocked, dep_map, depchecker, orphans=None, failed=None,
                 for providingpkg in providers:
                     eprint("fedretire --orphan --branch "
                            f"{branch} -- {providingpkg}")
-            info += wrap_and_format(
+            out.write(wrap_and_format(
                 f"Packages depending on packages orphaned{release_text} "
                 f"for more than {week_limit} weeks",
-                sorted(stale_breaking))
+                sorted(stale_breaking)))
 
     if failed:
         ftbfs_label = f"FTBFS{release_text}"
-        info += wrap_and_format(ftbfs_label, failed)
+        out.write(wrap_and_format(ftbfs_label, failed))
 
         ftbfs_breaking_deps = [o for o in failed if
                                o in dep_map and dep_map[o]]
 
-        info += wrap_and_format(f"{ftbfs_label} (depended on)", ftbfs_breaking_deps)
+        out.write(wrap_and_format(f"{ftbfs_label} (depended on)", ftbfs_breaking_deps))
 
         ftbfs_not_breaking_deps = [o for o in failed if
                                    o not in dep_map or not dep_map[o]]
 
-        info += wrap_and_format(f"{ftbfs_label} (not depended on)", ftbfs_not_breaking_deps)
+        out.write(wrap_and_format(f"{ftbfs_label} (not depended on)", ftbfs_not_breaking_deps))
 
 
     if depchecker.not_in_repo:
-        info += wrap_and_format(f"Not found in repo{release_text}", sorted(depchecker.not_in_repo))
+        out.write(wrap_and_format(f"Not found in repo{release_text}", sorted(depchecker.not_in_repo)))
 
 
     addresses = [f"{p}@fedoraproject.org"
                  for p in affected_people if p != ORPHAN_UID]
-    return info, addresses
+    return addresses
+
+
+def unblocked_orphans(release, failed, skip_orphans=False, skipblocked=True):
+    """ Return the pagure projects of the orphans by name and the sorted
+        list of orphans and ``failed`` packages that are not blocked in koji
+
+        Runs next to the dnf setup, so progress is only reported in full
+        lines that name the finished step.
+    """
+    if skip_orphans:
+        orphan_projects = {}
+    else:
+        # list of orphans from pagure
+        orphan_projects = orphan_packages()
+        eprint(f"Got list of {len(orphan_projects)} orphans from pagure")
+
+    allpkgs = sorted({*orphan_projects, *failed})
+    if skipblocked:
+        koji_tag = RELEASES[release]["koji_tag"]
+        koji_hub = RELEASES[release]["koji_hub"]
+        unblocked = unblocked_packages(allpkgs, tagID=koji_tag, kojihub=koji_hub)
+        eprint(f"Got {len(unblocked)} unblocked packages from koji")
+    else:
+        unblocked = allpkgs
+    return orphan_projects, unblocked
 
 
 def main():
@@ -724,6 +1268,13 @@ def main():
     parser.add_argument("--max_deps", dest="max_deps", type=int,
                         help="set max_deps on recursive find deps",
                         default=20)
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of processes to check dependencies "
+                             "with. With more than one, the walks run "
+                             "independently and do not share the packages "
+                             "they find, so the report can differ from "
+                             "--jobs 1. (Co)maintainer lookups are deferred "
+                             "until all walks finished.")
     parser.add_argument("--release", choices=RELEASES.keys(),
                         default="rawhide")
     parser.add_argument("--mailto", default=None,
@@ -736,6 +1287,9 @@ def main():
                         help="Source repo URL to use for depcheck")
     parser.add_argument("--repo", default=None,
                         help="Repo URL to use for depcheck")
+    parser.add_argument("--refresh", default=False, action="store_true",
+                        help="Check for new repo metadata even if the "
+                             "cached metadata is not expired")
     parser.add_argument("--json", default=None,
                         help="Export info about orphaned "
                              "packages to a specified JSON file")
@@ -747,6 +1301,10 @@ def main():
                         help="Additional packages, e.g. FTBFS packages")
     args = parser.parse_args()
     failed = args.failed
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    cache.backend.expire_old(CACHE_CLEANUP_AGE)
 
     if args.source_repo is not None:
         RELEASES[args.release]["source_repo"] = args.source_repo
@@ -754,43 +1312,50 @@ def main():
     if args.repo is not None:
         RELEASES[args.release]["repo"] = args.repo
 
-    if args.skip_orphans:
-        orphans = []
-    else:
-        # list of orphans from pagure
-        eprint('Contacting pagure for list of orphans...', end=' ')
-        orphans = sorted(orphan_packages())
-        eprint('done')
-
-    text = "Report started at %s\n\n" % datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    eprint('Getting builds from koji...', end=' ')
-    allpkgs = sorted(list(set(list(orphans) + failed)))
-    if args.skipblocked:
-        koji_tag = RELEASES[args.release]["koji_tag"]
-        koji_hub = RELEASES[args.release]["koji_hub"]
-        unblocked = unblocked_packages(allpkgs, tagID=koji_tag, kojihub=koji_hub)
+    # Write the report as it is created, only keep it if it is mailed
+    if args.mailto or args.send:
+        report = io.StringIO()
     else:
-        unblocked = allpkgs
-    eprint('done')
-
-    text += HEADER.format(RELEASES[args.release]["koji_tag"].upper())
-    eprint("Setting up dependency checker...", end=' ')
-    depchecker = DepChecker(args.release)
-    eprint("done")
+        report = sys.stdout
+
+    report.write("Report started at %s\n\n" % datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"))
+
+    # The package lists do not depend on the repos, get them from pagure and
+    # koji while dnf loads the repos
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        packages_future = executor.submit(
+            unblocked_orphans, args.release, failed,
+            skip_orphans=args.skip_orphans, skipblocked=args.skipblocked)
+        eprint("Setting up dependency checker, getting orphans from pagure "
+               "and blocked packages from koji")
+        depchecker = DepChecker(args.release, refresh=args.refresh)
+        eprint("Set up dependency checker")
+        orphan_projects, unblocked = packages_future.result()
+    orphans = sorted(orphan_projects)
+    # the orphan listing has the (co)maintainer information already, only
+    # the unblocked orphans are reported
+    depchecker.add_pagure_projects({pkg: orphan_projects[pkg]
+                                    for pkg in unblocked
+                                    if pkg in orphan_projects})
+
+    report.write(HEADER.format(RELEASES[args.release]["koji_tag"].upper()))
 
     eprint('Calculating dependencies...', end=' ')
     # Create dnf object and depsolve out if requested.
     # TODO: add app args to either depsolve or not
-    dep_map, incomplete = depchecker.recursive_deps(unblocked, args.max_deps)
+    dep_map, incomplete = depchecker.recursive_deps(unblocked, args.max_deps,
+                                                    jobs=args.jobs,
+                                                    free_sack=True)
     eprint('done')
-    info, addresses = package_info(
-        unblocked, dep_map, depchecker, orphans=orphans, failed=failed,
-        release=args.release, incomplete=incomplete)
-    text += "\n"
-    text += info
-    text += FOOTER
-    text += "\nReport finished at %s" % datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(text)
+    report.write("\n")
+    addresses = package_info(
+        report, unblocked, dep_map, depchecker, orphans=orphans,
+        failed=failed, release=args.release, incomplete=incomplete)
+    report.write(FOOTER)
+    report.write("\nReport finished at %s\n" % datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"))
+    if report is not sys.stdout:
+        text = report.getvalue()
+        print(text, end="")
 
     if args.json is not None:
         eprint(f'Saving {args.json} with machine readable info')
@@ -799,8 +1364,14 @@ def main():
         ap = {pkg: sorted(reasons) for pkg, reasons in depchecker.dep_chain.items()}
         json_data = {'status_change': sc, 'affected_packages': ap}
         try:
-            with open(args.json, 'w') as f:
-                json.dump(json_data, f, indent=4, sort_keys=True)
+            if orjson is not None:
+                with open(args.json, 'wb') as f:
+                    f.write(orjson.dumps(
+                        json_data,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+            else:
+                with open(args.json, 'w') as f:
+                    json.dump(json_data, f, indent=2, sort_keys=True)
         except OSError as e:
             eprint(f'Cannot save {args.json}:', end=' ')
             eprint(f'{type(e).__name__}: e')